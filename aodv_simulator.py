@@ -1,15 +1,24 @@
 import pygame
+import numpy as np
 import random
 import math
 import time
 import os
 import struct
 import datetime
+import heapq
+import queue
+import threading
 from collections import deque, defaultdict
 from enum import Enum
 import subprocess
 import sys
 
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; the NumPy kernels below are used instead
+    njit = None
+
 # Initialize Pygame
 pygame.init()
 
@@ -18,6 +27,18 @@ WIDTH, HEIGHT = 1600, 900
 NETWORK_WIDTH = 1300
 NODE_RADIUS = 14
 PACKET_RADIUS = 7
+COMMUNICATION_RANGE = 130
+# Node pairs between these fractions of the range may get an extra link
+EXTRA_LINK_MIN = 0.8
+EXTRA_LINK_MAX = 1.2
+# Grid cells must cover the widest link distance (the extra-link band)
+GRID_CELL_SIZE = math.ceil(COMMUNICATION_RANGE * EXTRA_LINK_MAX)
+# Number of alternate routes looked for in a single route discovery
+MAX_ROUTES = 5
+# Only the most recent explored paths are kept for drawing
+MAX_DRAWN_PATHS = 50
+# Captured packets are encoded for the PCAP dump in batches of this size
+PCAP_BATCH_SIZE = 256
 NODE_COLOR = (70, 130, 180)
 RREQ_COLOR = (255, 140, 0)
 RREP_COLOR = (30, 144, 255)
@@ -38,6 +59,116 @@ COLUMN_BG = (25, 35, 50, 180)
 SCROLLBAR_COLOR = (100, 120, 140)
 SCROLLBAR_HOVER = (120, 140, 160)
 
+# Surface.fblits is only available in pygame-ce
+HAS_FBLITS = hasattr(pygame.Surface, "fblits")
+
+def blit_batch(screen, blits_list):
+    """Blit a sequence of (surface, position) pairs in a single call"""
+    if HAS_FBLITS:
+        screen.fblits(blits_list)
+    else:
+        screen.blits(blits_list, doreturn=False)
+
+def grid_cell(x, y):
+    """Return the spatial grid cell containing the point (x, y)"""
+    return (int(x // GRID_CELL_SIZE), int(y // GRID_CELL_SIZE))
+
+def grid_neighbors(grid, cell):
+    """Yield every node in the given cell and its 8 surrounding cells"""
+    cx, cy = cell
+    for gx in (cx - 1, cx, cx + 1):
+        for gy in (cy - 1, cy, cy + 1):
+            occupants = grid.get((gx, gy))
+            if occupants:
+                yield from occupants
+
+def step_positions(xs, ys, vxs, vys, step, margin, max_x, max_y):
+    """Advance node positions in place, bouncing off the network margins"""
+    xs += vxs * step
+    ys += vys * step
+    np.negative(vxs, out=vxs, where=(xs < margin) | (xs > max_x))
+    np.negative(vys, out=vys, where=(ys < margin) | (ys > max_y))
+    np.clip(xs, margin, max_x, out=xs)
+    np.clip(ys, margin, max_y, out=ys)
+
+def neighbor_lists(xs, ys, range_sq):
+    """Return each node's in-range neighbors in CSR form (indptr, indices).
+
+    Node i's neighbor ids, ascending, are indices[indptr[i]:indptr[i + 1]].
+    """
+    dx = xs[:, None] - xs[None, :]
+    dy = ys[:, None] - ys[None, :]
+    adjacency = dx * dx + dy * dy <= range_sq[:, None]
+    np.fill_diagonal(adjacency, False)
+    indptr = np.zeros(xs.shape[0] + 1, np.int64)
+    np.cumsum(adjacency.sum(axis=1), out=indptr[1:])
+    return indptr, np.nonzero(adjacency)[1]
+
+if njit is not None:
+    # Compiled equivalents of the kernels above, replacing them when Numba is installed
+    @njit(cache=True, fastmath=True)
+    def step_positions(xs, ys, vxs, vys, step, margin, max_x, max_y):
+        for i in range(xs.shape[0]):
+            x = xs[i] + vxs[i] * step
+            y = ys[i] + vys[i] * step
+            if x < margin or x > max_x:
+                vxs[i] = -vxs[i]
+            if y < margin or y > max_y:
+                vys[i] = -vys[i]
+            xs[i] = min(max(x, margin), max_x)
+            ys[i] = min(max(y, margin), max_y)
+
+    @njit(cache=True)
+    def neighbor_lists(xs, ys, range_sq):
+        n = xs.shape[0]
+        
+        # Bucket nodes into a uniform grid so each node only scans the 3x3 cells around it
+        cols = NETWORK_WIDTH // GRID_CELL_SIZE + 1
+        rows = HEIGHT // GRID_CELL_SIZE + 1
+        cell_of = np.empty(n, np.int64)
+        starts = np.zeros(cols * rows + 1, np.int64)
+        for i in range(n):
+            cx = min(max(int(xs[i] // GRID_CELL_SIZE), 0), cols - 1)
+            cy = min(max(int(ys[i] // GRID_CELL_SIZE), 0), rows - 1)
+            cell_of[i] = cy * cols + cx
+            starts[cell_of[i] + 1] += 1
+        for c in range(cols * rows):
+            starts[c + 1] += starts[c]
+        fill = starts[:-1].copy()
+        order = np.empty(n, np.int64)
+        for i in range(n):
+            order[fill[cell_of[i]]] = i
+            fill[cell_of[i]] += 1
+        
+        # Rows are written straight into the CSR arrays, growing indices as needed
+        indptr = np.zeros(n + 1, np.int64)
+        indices = np.empty(max(n * 8, 1), np.int64)
+        row = np.empty(n, np.int64)
+        for i in range(n):
+            count = 0
+            cx = cell_of[i] % cols
+            cy = cell_of[i] // cols
+            for gy in range(max(cy - 1, 0), min(cy + 2, rows)):
+                for gx in range(max(cx - 1, 0), min(cx + 2, cols)):
+                    c = gy * cols + gx
+                    for k in range(starts[c], starts[c + 1]):
+                        j = order[k]
+                        if j != i:
+                            dx = xs[i] - xs[j]
+                            dy = ys[i] - ys[j]
+                            if dx * dx + dy * dy <= range_sq[i]:
+                                row[count] = j
+                                count += 1
+            
+            start = indptr[i]
+            if start + count > indices.shape[0]:
+                grown = np.empty(max(indices.shape[0] * 2, start + count), np.int64)
+                grown[:start] = indices[:start]
+                indices = grown
+            indices[start:start + count] = np.sort(row[:count])
+            indptr[i + 1] = start + count
+        return indptr, indices[:indptr[n]]
+
 class GameState(Enum):
     INTRODUCTION = 1
     SIMULATION = 2
@@ -48,44 +179,58 @@ class PacketType(Enum):
     DATA = 3
     RERR = 4
 
+PACKET_COLORS = {
+    PacketType.RREQ: RREQ_COLOR,
+    PacketType.RREP: RREP_COLOR,
+    PacketType.DATA: DATA_COLOR,
+    PacketType.RERR: RERR_COLOR,
+}
+
+# Fixed-width AODV record: type, source, destination, hop count, sequence number
+AODV_RECORD = struct.Struct("<BHHBH")
+# libpcap file header: magic, version 2.4, UTC offset, accuracy, snaplen, link type
+# (147 = LINKTYPE_USER0, since the payload is the AODV record rather than a real frame)
+PCAP_GLOBAL_HEADER = struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 65535, 147)
+# One capture record: seconds, microseconds, captured and original length, then the AODV record
+PCAP_RECORD = struct.Struct("<IIII" + AODV_RECORD.format[1:])
+
 class PCAPPacket:
     """Class to store packet data for PCAP generation"""
-    def __init__(self, timestamp, src_node, dst_node, packet_type, hop_count, path=None):
+    __slots__ = ('timestamp', 'src_node', 'dst_node', 'packet_type', 'hop_count', 'path', 'seq_num', 'ttl')
+    
+    def __init__(self, timestamp, src_node, dst_node, packet_type, hop_count, path=None, seq_num=0):
         self.timestamp = timestamp
         self.src_node = src_node
         self.dst_node = dst_node
         self.packet_type = packet_type
         self.hop_count = hop_count
         self.path = path or []
-        self.seq_num = random.randint(1, 1000)
+        self.seq_num = seq_num
         self.ttl = 64
         
-    def to_bytes(self):
-        """Convert packet to bytes for PCAP (simplified version)"""
-        # Simplified packet structure for demonstration
-        # In real implementation, you'd use scapy or proper AODV packet format
-        packet_data = f"AODV|{self.packet_type.name}|Src:{self.src_node}|Dst:{self.dst_node}|Hops:{self.hop_count}|Seq:{self.seq_num}"
-        return packet_data.encode('utf-8')
-    
-    def get_wireshark_info(self):
-        """Get display string for Wireshark"""
-        type_str = self.packet_type.name
-        if self.packet_type == PacketType.RREQ:
-            type_str = "Route Request"
-        elif self.packet_type == PacketType.RREP:
-            type_str = "Route Reply"
-        elif self.packet_type == PacketType.DATA:
-            type_str = "Data"
-        elif self.packet_type == PacketType.RERR:
-            type_str = "Route Error"
-        
-        return f"AODV {type_str}: Node {self.src_node} -> Node {self.dst_node} (Hops: {self.hop_count}, Seq: {self.seq_num})"
+    def to_pcap_record(self):
+        """Pack the libpcap record header and AODV_RECORD payload in one call"""
+        seconds = int(self.timestamp)
+        micros = int((self.timestamp - seconds) * 1000000)
+        return PCAP_RECORD.pack(seconds, micros, AODV_RECORD.size, AODV_RECORD.size,
+                                self.packet_type.value, self.src_node, self.dst_node,
+                                min(self.hop_count, 255), self.seq_num & 0xFFFF)
 
 class AnimatedPacket:
-    def __init__(self, packet_id, packet_type, path, base_speed=0.8, from_node=None, to_node=None):
+    __slots__ = ('id', 'type', 'path', 'visited', 'current_node_index', 'progress', 'base_speed', 'completed', 'color',
+                 'from_node', 'to_node', 'hop_count', 'timestamp',
+                 '_segment_index', '_sx', '_sy', '_dx', '_dy')
+    
+    def __init__(self, packet_id, packet_type, path, base_speed=0.8, from_node=None, to_node=None, visited=None):
         self.id = packet_id
         self.type = packet_type
         self.path = path
+        # Bitmask of node ids on the path (bit i set for node i), for O(1) loop checks when forwarding
+        if visited is None:
+            visited = 0
+            for node_id in path:
+                visited |= 1 << node_id
+        self.visited = visited
         self.current_node_index = 0
         self.progress = 0.0
         self.base_speed = base_speed
@@ -95,17 +240,14 @@ class AnimatedPacket:
         self.to_node = to_node
         self.hop_count = len(path) - 1 if path else 0
         self.timestamp = time.time()
+        # Start point and delta of the segment being travelled, refreshed per hop
+        # and whenever the nodes move
+        self._segment_index = -1
+        self._sx = self._sy = 0.0
+        self._dx = self._dy = 0.0
         
     def get_color(self):
-        if self.type == PacketType.RREQ:
-            return RREQ_COLOR
-        elif self.type == PacketType.RREP:
-            return RREP_COLOR
-        elif self.type == PacketType.DATA:
-            return DATA_COLOR
-        elif self.type == PacketType.RERR:
-            return RERR_COLOR
-        return (255, 255, 255)
+        return PACKET_COLORS.get(self.type, (255, 255, 255))
     
     def update(self, delta_time, speed_multiplier=1.0):
         if self.completed:
@@ -129,21 +271,42 @@ class AnimatedPacket:
             end_node = nodes[self.path[-1]]
             return (end_node.x, end_node.y)
             
-        start_node = nodes[self.path[self.current_node_index]]
-        end_node = nodes[self.path[self.current_node_index + 1]]
-        
-        x = start_node.x + (end_node.x - start_node.x) * self.progress
-        y = start_node.y + (end_node.y - start_node.y) * self.progress
-        
-        return (int(x), int(y))
-    
-    def draw(self, screen, nodes):
-        pos = self.get_current_position(nodes)
-        if pos:
-            pygame.draw.circle(screen, self.color, pos, PACKET_RADIUS)
-            pygame.draw.circle(screen, (255, 255, 255), pos, PACKET_RADIUS, 1)
+        if self._segment_index != self.current_node_index:
+            start_node = nodes[self.path[self.current_node_index]]
+            end_node = nodes[self.path[self.current_node_index + 1]]
+            self._sx = start_node.x
+            self._sy = start_node.y
+            self._dx = end_node.x - start_node.x
+            self._dy = end_node.y - start_node.y
+            self._segment_index = self.current_node_index
+        
+        return (int(self._sx + self._dx * self.progress), int(self._sy + self._dy * self.progress))
+    
+    def invalidate_segment(self):
+        """Drop the cached segment geometry after the nodes it spans have moved"""
+        self._segment_index = -1
+    
+    @staticmethod
+    def render_sprite(color):
+        """Pre-render the colored disc and white outline used to draw a packet"""
+        size = PACKET_RADIUS * 2 + 2
+        sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+        center = (size // 2, size // 2)
+        pygame.draw.circle(sprite, color, center, PACKET_RADIUS)
+        pygame.draw.circle(sprite, (255, 255, 255), center, PACKET_RADIUS, 1)
+        return sprite
 
 class Node:
+    __slots__ = ('id', 'x', 'y', 'vx', 'vy', 'neighbors', 'original_neighbors', 'routing_table',
+                 'sequence_number', 'color', 'active', 'communication_range', 'range_sq',
+                 'is_moving', 'mac_address', '_sprites', '_cached_surface', '_cached_state',
+                 '_neighbor_ids', '_original_neighbor_ids')
+    
+    # Range halos shared by every node, keyed by radius
+    _range_surfaces = {}
+    # Rendered id labels, keyed by (font, id) so new formations reuse them
+    _label_surfaces = {}
+    
     def __init__(self, id, x, y):
         self.id = id
         self.x = x
@@ -152,40 +315,35 @@ class Node:
         self.vy = 0
         self.neighbors = []
         self.original_neighbors = []
+        # Id sets mirroring the lists above for O(1) membership tests
+        self._neighbor_ids = set()
+        self._original_neighbor_ids = set()
         self.routing_table = {}
         self.sequence_number = 0
         self.color = NODE_COLOR
         self.active = True
-        self.communication_range = 130
-        self.rreq_seen = set()
+        self.communication_range = COMMUNICATION_RANGE
+        self.range_sq = COMMUNICATION_RANGE * COMMUNICATION_RANGE
         self.is_moving = False
         self.mac_address = f"00:1A:2B:3C:{id:02X}:{id:02X}"
+        self._sprites = {}
+        self._cached_surface = None
+        self._cached_state = None
         
-    def distance_to(self, other_node):
-        return math.sqrt((self.x - other_node.x)**2 + (self.y - other_node.y)**2)
+    def distance_sq(self, other_node):
+        """Squared distance, for threshold tests that do not need the square root"""
+        dx = self.x - other_node.x
+        dy = self.y - other_node.y
+        return dx * dx + dy * dy
     
     def add_neighbor(self, neighbor):
-        if neighbor not in self.neighbors:
+        if neighbor.id not in self._neighbor_ids:
+            self._neighbor_ids.add(neighbor.id)
             self.neighbors.append(neighbor)
-        if neighbor not in self.original_neighbors:
+        if neighbor.id not in self._original_neighbor_ids:
+            self._original_neighbor_ids.add(neighbor.id)
             self.original_neighbors.append(neighbor)
     
-    def update_position(self, delta_time):
-        if not self.is_moving:
-            return
-            
-        self.x += self.vx * delta_time * 8
-        self.y += self.vy * delta_time * 8
-        
-        margin = 50
-        if self.x < margin or self.x > NETWORK_WIDTH - margin:
-            self.vx *= -1
-        if self.y < margin or self.y > HEIGHT - margin:
-            self.vy *= -1
-            
-        self.x = max(margin, min(NETWORK_WIDTH - margin, self.x))
-        self.y = max(margin, min(HEIGHT - margin, self.y))
-    
     def start_moving(self):
         self.is_moving = True
         self.vx = random.uniform(-0.5, 0.5)
@@ -196,23 +354,39 @@ class Node:
         self.vx = 0
         self.vy = 0
     
-    def update_neighbors(self, all_nodes):
+    def update_neighbors(self, neighbors):
         if not self.is_moving:
             return
             
-        self.neighbors = []
-        for node in all_nodes:
-            if node != self and self.distance_to(node) <= self.communication_range:
-                self.neighbors.append(node)
-    
-    def draw(self, screen, font, selected=False, is_source=False, is_dest=False):
-        if is_source or is_dest:
-            range_surface = pygame.Surface((self.communication_range * 2, self.communication_range * 2), pygame.SRCALPHA)
-            pygame.draw.circle(range_surface, (*RANGE_COLOR, 20), 
-                             (self.communication_range, self.communication_range), 
-                             self.communication_range)
-            screen.blit(range_surface, (self.x - self.communication_range, self.y - self.communication_range))
-        
+        self.neighbors = neighbors
+        self._neighbor_ids = {neighbor.id for neighbor in neighbors}
+    
+    def get_range_blit(self):
+        """Return the (surface, position) pair for the communication-range halo"""
+        r = self.communication_range
+        surface = Node._range_surfaces.get(r)
+        if surface is None:
+            # Translucent halo shown around the source and destination
+            surface = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
+            pygame.draw.circle(surface, (*RANGE_COLOR, 20), (r, r), r)
+            Node._range_surfaces[r] = surface
+        return (surface, (int(self.x - r), int(self.y - r)))
+    
+    def get_blit(self, font, selected=False, is_source=False, is_dest=False):
+        """Return the (surface, position) pair for this node's cached sprite"""
+        state = (self.color, selected, is_source, is_dest)
+        if state != self._cached_state:
+            sprite = self._sprites.get(state)
+            if sprite is None:
+                sprite = self._render_sprite(font, *state)
+                self._sprites[state] = sprite
+            self._cached_surface = sprite
+            self._cached_state = state
+        
+        surface = self._cached_surface
+        return (surface, (int(self.x) - surface.get_width() // 2, int(self.y) - surface.get_height() // 2))
+    
+    def _render_sprite(self, font, base_color, selected, is_source, is_dest):
         if is_source:
             color = (50, 205, 50)
         elif is_dest:
@@ -220,17 +394,26 @@ class Node:
         elif selected:
             color = (255, 255, 100)
         else:
-            color = self.color
-            
-        pygame.draw.circle(screen, color, (self.x, self.y), NODE_RADIUS)
-        pygame.draw.circle(screen, (255, 255, 255), (self.x, self.y), NODE_RADIUS, 1)
+            color = base_color
         
-        text_surface = font.render(str(self.id), True, TEXT_COLOR)
+        text_surface = Node._label_surfaces.get((font, self.id))
+        if text_surface is None:
+            text_surface = font.render(str(self.id), True, TEXT_COLOR)
+            Node._label_surfaces[(font, self.id)] = text_surface
         text_width = text_surface.get_width()
+        size = NODE_RADIUS * 2 + 2
+        width = max(size, text_width)
+        height = max(size, text_surface.get_height())
+        
+        sprite = pygame.Surface((width, height), pygame.SRCALPHA)
+        center = (width // 2, height // 2)
+        pygame.draw.circle(sprite, color, center, NODE_RADIUS)
+        pygame.draw.circle(sprite, (255, 255, 255), center, NODE_RADIUS, 1)
         
         if text_width < NODE_RADIUS * 2 or is_source or is_dest:
-            text_rect = text_surface.get_rect(center=(self.x, self.y))
-            screen.blit(text_surface, text_rect)
+            text_rect = text_surface.get_rect(center=center)
+            sprite.blit(text_surface, text_rect)
+        return sprite
 
 class Button:
     def __init__(self, x, y, width, height, text, font, color=BUTTON_COLOR, hover_color=BUTTON_HOVER_COLOR):
@@ -240,6 +423,7 @@ class Button:
         self.color = color
         self.hover_color = hover_color
         self.hovered = False
+        self.dirty = True  # set whenever the button needs to be redrawn
         
     def draw(self, screen):
         color = self.hover_color if self.hovered else self.color
@@ -251,8 +435,16 @@ class Button:
         screen.blit(text_surface, text_rect)
         
     def is_hovered(self, pos):
-        self.hovered = self.rect.collidepoint(pos)
+        hovered = bool(self.rect.collidepoint(pos))
+        if hovered != self.hovered:
+            self.hovered = hovered
+            self.dirty = True
         return self.hovered
+    
+    def set_text(self, text):
+        if text != self.text:
+            self.text = text
+            self.dirty = True
         
     def is_clicked(self, pos, event):
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
@@ -266,6 +458,7 @@ class ToggleButton:
         self.font = font
         self.state = initial_state
         self.hovered = False
+        self.dirty = True
         
     def draw(self, screen):
         color = TOGGLE_ON_COLOR if self.state else TOGGLE_OFF_COLOR
@@ -285,6 +478,7 @@ class ToggleButton:
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
             if self.rect.collidepoint(pos):
                 self.state = not self.state
+                self.dirty = True
                 return True
         return False
 
@@ -294,8 +488,10 @@ class InputBox:
         self.text = text
         self.font = font
         self.active = False
+        self.dirty = True
         
     def handle_event(self, event):
+        previous = (self.text, self.active)
         if event.type == pygame.MOUSEBUTTONDOWN:
             self.active = self.rect.collidepoint(event.pos)
         if event.type == pygame.KEYDOWN and self.active:
@@ -306,6 +502,8 @@ class InputBox:
             else:
                 if event.unicode.isdigit() and len(self.text) < 3:
                     self.text += event.unicode
+        if (self.text, self.active) != previous:
+            self.dirty = True
         return self.text
         
     def draw(self, screen):
@@ -325,8 +523,10 @@ class Slider:
         self.dragging = False
         self.font = font
         self.label = label
+        self.dirty = True
         
     def handle_event(self, event):
+        previous = (self.value, self.dragging)
         if event.type == pygame.MOUSEBUTTONDOWN:
             if self.rect.collidepoint(event.pos):
                 self.dragging = True
@@ -335,6 +535,8 @@ class Slider:
             self.dragging = False
         elif event.type == pygame.MOUSEMOTION and self.dragging:
             self.update_value(event.pos[0])
+        if (self.value, self.dragging) != previous:
+            self.dirty = True
             
     def update_value(self, x_pos):
         relative_x = max(0, min(x_pos - self.rect.x, self.rect.width))
@@ -363,23 +565,14 @@ class EventLog:
         self.scrollbar_dragging = False
         self.scrollbar_handle_height = 50
         self.total_events = 0
+        self.dirty = True
         
     def add_event(self, event_text, packet_type=None, from_node=None, to_node=None, hop_count=None):
         timestamp = time.strftime("%H:%M:%S")
         event_details = f"[{timestamp}] {event_text}"
         
         if packet_type:
-            type_str = ""
-            if packet_type == PacketType.RREQ:
-                type_str = "RREQ"
-            elif packet_type == PacketType.RREP:
-                type_str = "RREP"
-            elif packet_type == PacketType.DATA:
-                type_str = "DATA"
-            elif packet_type == PacketType.RERR:
-                type_str = "RERR"
-            
-            event_details = f"[{timestamp}] {type_str}: {event_text}"
+            event_details = f"[{timestamp}] {packet_type.name}: {event_text}"
             
             if from_node is not None and to_node is not None:
                 event_details += f" (Node {from_node} → Node {to_node})"
@@ -387,17 +580,36 @@ class EventLog:
             if hop_count is not None:
                 event_details += f" [Hops: {hop_count}]"
         
-        self.events.append(event_details)
+        color = PACKET_COLORS.get(packet_type, TEXT_COLOR)
+        self.events.append((event_details, color, self.render_event(event_details, color)))
         self.total_events += 1
+        self.dirty = True
+    
+    def clear(self):
+        self.events.clear()
+        self.scroll_offset = 0
+        self.total_events = 0
+        self.dirty = True
+    
+    def render_event(self, event_text, color):
+        """Truncate an event line to the panel width and render it once"""
+        max_width = self.rect.width - 30
+        while self.font.size(event_text)[0] > max_width and len(event_text) > 20:
+            event_text = event_text[:-4] + "..."
+        return self.font.render(event_text, True, color)
         
     def handle_event(self, event, mouse_pos):
         if event.type == pygame.MOUSEBUTTONDOWN:
             if self.scrollbar_rect.collidepoint(mouse_pos):
                 self.scrollbar_dragging = True
+                self.dirty = True
                 return True
         elif event.type == pygame.MOUSEBUTTONUP:
-            self.scrollbar_dragging = False
+            if self.scrollbar_dragging:
+                self.scrollbar_dragging = False
+                self.dirty = True
         elif event.type == pygame.MOUSEMOTION and self.scrollbar_dragging:
+            self.dirty = True
             relative_y = mouse_pos[1] - self.rect.y - 40
             max_scroll = max(0, len(self.events) * 25 - (self.rect.height - 50))
             self.scroll_offset = max(0, min(max_scroll, 
@@ -406,6 +618,7 @@ class EventLog:
         elif event.type == pygame.MOUSEWHEEL:
             max_scroll = max(0, len(self.events) * 25 - (self.rect.height - 50))
             self.scroll_offset = max(0, min(max_scroll, self.scroll_offset - event.y * 20))
+            self.dirty = True
             return True
         return False
         
@@ -426,29 +639,11 @@ class EventLog:
                                self.rect.width - 20, self.rect.height - 50)
         screen.set_clip(clip_rect)
         
-        visible_events = list(self.events)
-        for i, event in enumerate(visible_events):
+        for i, (_, _, text) in enumerate(self.events):
             y_pos = self.rect.y + 50 + i * 25 - self.scroll_offset
             
             # Only draw if within visible area
             if y_pos < self.rect.y + self.rect.height - 10 and y_pos > self.rect.y + 40:
-                color = TEXT_COLOR
-                if "RREQ" in event:
-                    color = RREQ_COLOR
-                elif "RREP" in event:
-                    color = RREP_COLOR
-                elif "DATA" in event:
-                    color = DATA_COLOR
-                elif "RERR" in event:
-                    color = RERR_COLOR
-                
-                # Truncate long text
-                max_width = self.rect.width - 30
-                event_text = event
-                while self.font.size(event_text)[0] > max_width and len(event_text) > 20:
-                    event_text = event_text[:-4] + "..."
-                
-                text = self.font.render(event_text, True, color)
                 screen.blit(text, (self.rect.x + 10, y_pos))
         
         screen.set_clip(None)
@@ -467,6 +662,22 @@ class EventLog:
             pygame.draw.rect(screen, scrollbar_color, handle_rect, border_radius=3)
             pygame.draw.rect(screen, (150, 150, 150), handle_rect, 1, border_radius=3)
 
+class NullEventLog:
+    """Stand-in event log that discards events, so callers need no None checks"""
+    dirty = False
+    
+    def add_event(self, event_text, packet_type=None, from_node=None, to_node=None, hop_count=None):
+        pass
+    
+    def clear(self):
+        pass
+    
+    def draw(self, screen):
+        pass
+    
+    def handle_event(self, event, mouse_pos):
+        return False
+
 class AODVSimulator:
     def __init__(self):
         self.nodes = []
@@ -479,20 +690,64 @@ class AODVSimulator:
         self.simulation_complete = False
         self.packet_counter = 0
         self.final_path = []
-        self.discovered_paths = []
+        self.discovered_paths = deque(maxlen=MAX_DRAWN_PATHS)
         self.all_discovered_paths_to_dest = []
         self.animation_speed = 1.0
-        self.rreq_broadcast_id = 0
         self.best_path_hop_count = float('inf')
         self.route_established = False
         self.mobility_enabled = False
-        self.event_log = None
+        self.event_log = NullEventLog()  # replaced by a real EventLog when the UI is built
+        # Control commands posted by the UI, applied at the start of the next tick
+        self._mailbox = queue.SimpleQueue()
+        self._handlers = {
+            PacketType.RREQ: self._on_rreq,
+            PacketType.RREP: self._on_rrep,
+            PacketType.DATA: self._on_data,
+            PacketType.RERR: self._on_rerr,
+        }
+        self.verbose_log = True  # log every RREQ fan-out hop rather than one summary per node
         self.pcap_packets = []  # Store packets for PCAP generation
         self.pcap_enabled = False
+        self._seq_ctr = 0  # sequence number of the last recorded PCAP packet
+        # Captured packets are encoded and written by a background thread
+        self._pcap_queue = queue.Queue()
+        threading.Thread(target=self._pcap_worker, daemon=True).start()
+        # Structure-of-arrays copy of node kinematics, indexed by node id
+        self._xs = np.empty(0, np.float32)
+        self._ys = np.empty(0, np.float32)
+        self._vxs = np.empty(0, np.float32)
+        self._vys = np.empty(0, np.float32)
+        self._range_sq = np.empty(0, np.float32)
+        self._neighbor_csr = None  # (indptr, indices) from the last mobility step
+        self._adjacency = None  # node id -> neighbor ids, rebuilt lazily
+        self._path_cache = {}  # (source, destination, excluded links) -> k shortest paths
+        self._broken_links = set()  # links broken by simulated route errors
+        self.planned_routes = []
+        self._route_edges = set()  # directed (from, to) hops on the planned routes
+        self._packet_sprites = {packet_type: AnimatedPacket.render_sprite(color)
+                                for packet_type, color in PACKET_COLORS.items()}
+        self._background = None  # static background and grid, rendered on first draw
+        self._links_surface = None  # background plus neighbor links
+        self._links_dirty = True  # set whenever links or node positions change
+        self._edges = []  # unique (low id, high id) neighbor links, drawn once each
+        self._path_points = {}  # path tuple -> polyline points for the current positions
+        # Dirty-rect bookkeeping: bumped whenever the network area changes beyond packet motion
+        self._scene_version = 0
+        self._scene_key = None
+        self._packet_rects = []
+        self._last_packet_rects = []
         self.setup_nodes()
         
     def setup_nodes(self):
         self.nodes = []
+        grid = defaultdict(list)  # grid cell -> nodes in that cell, only needed while building
+        self._neighbor_csr = None
+        self._adjacency = None
+        self._path_cache.clear()
+        self._broken_links.clear()
+        self._scene_version += 1
+        self._links_dirty = True
+        self._path_points.clear()
         margin = 60
         
         nodes_created = 0
@@ -503,13 +758,15 @@ class AODVSimulator:
             y = random.randint(margin, HEIGHT - margin)
             
             too_close = False
-            for node in self.nodes:
-                if math.sqrt((x - node.x)**2 + (y - node.y)**2) < 40:
+            for node in grid_neighbors(grid, grid_cell(x, y)):
+                dx = x - node.x
+                dy = y - node.y
+                if dx * dx + dy * dy < 40 * 40:
                     too_close = True
                     break
             
             if not too_close:
-                self.nodes.append(Node(nodes_created, x, y))
+                self._add_node(grid, Node(nodes_created, x, y))
                 nodes_created += 1
             max_attempts -= 1
         
@@ -518,105 +775,250 @@ class AODVSimulator:
             for i in range(remaining_nodes):
                 x = random.randint(margin, NETWORK_WIDTH - margin)
                 y = random.randint(margin, HEIGHT - margin)
-                self.nodes.append(Node(nodes_created + i, x, y))
+                self._add_node(grid, Node(nodes_created + i, x, y))
         
         connection_count = 0
-        for i, node1 in enumerate(self.nodes):
-            for j, node2 in enumerate(self.nodes):
-                if i != j:
-                    distance = node1.distance_to(node2)
-                    if distance <= node1.communication_range:
-                        node1.add_neighbor(node2)
-                        connection_count += 1
+        for node1 in self.nodes:
+            range_sq = node1.range_sq
+            for node2 in grid_neighbors(grid, grid_cell(node1.x, node1.y)):
+                if node2 is not node1 and node1.distance_sq(node2) <= range_sq:
+                    node1.add_neighbor(node2)
+                    connection_count += 1
         
         extra_connections = 0
-        for i in range(len(self.nodes)):
-            for j in range(i + 1, len(self.nodes)):
-                if i != j:
-                    node1 = self.nodes[i]
-                    node2 = self.nodes[j]
-                    distance = node1.distance_to(node2)
-                    if (node1.communication_range * 0.8 <= distance <= node1.communication_range * 1.2 and
+        min_factor_sq = EXTRA_LINK_MIN * EXTRA_LINK_MIN
+        max_factor_sq = EXTRA_LINK_MAX * EXTRA_LINK_MAX
+        for node1 in self.nodes:
+            min_sq = node1.range_sq * min_factor_sq
+            max_sq = node1.range_sq * max_factor_sq
+            for node2 in grid_neighbors(grid, grid_cell(node1.x, node1.y)):
+                if node2.id > node1.id:
+                    if (min_sq <= node1.distance_sq(node2) <= max_sq and
                         random.random() < 0.3):
                         node1.add_neighbor(node2)
                         node2.add_neighbor(node1)
                         extra_connections += 2
         
+        self._load_arrays()
+        self._rebuild_edges()
         print(f"Created {len(self.nodes)} nodes with {connection_count} basic + {extra_connections} extra connections")
     
+    def _add_node(self, grid, node):
+        self.nodes.append(node)
+        grid[grid_cell(node.x, node.y)].append(node)
+    
+    def _load_arrays(self):
+        """Copy node positions and velocities into the vectorized arrays.
+
+        While nodes move the arrays are authoritative for velocity; only positions
+        are copied back to the Node objects, since drawing and routing read them.
+        """
+        self._xs = np.array([node.x for node in self.nodes], np.float32)
+        self._ys = np.array([node.y for node in self.nodes], np.float32)
+        self._vxs = np.array([node.vx for node in self.nodes], np.float32)
+        self._vys = np.array([node.vy for node in self.nodes], np.float32)
+        self._range_sq = np.array([node.range_sq for node in self.nodes], np.float32)
+    
+    def _step_mobility(self, delta_time):
+        """Advance every node one frame and refresh neighbors from the new positions"""
+        xs, ys, vxs, vys = self._xs, self._ys, self._vxs, self._vys
+        step = delta_time * 8
+        margin = 50
+        step_positions(xs, ys, vxs, vys, step, margin, NETWORK_WIDTH - margin, HEIGHT - margin)
+        
+        for node, x, y in zip(self.nodes, xs.tolist(), ys.tolist()):
+            node.x = x
+            node.y = y
+        self._links_dirty = True
+        self._path_points.clear()
+        for packet in self.active_packets:
+            packet.invalidate_segment()
+        
+        indptr, indices = neighbor_lists(xs, ys, self._range_sq)
+        previous = self._neighbor_csr
+        if (previous is not None and np.array_equal(indptr, previous[0]) and
+            np.array_equal(indices, previous[1])):
+            return
+        self._neighbor_csr = (indptr, indices)
+        self._adjacency = None
+        self._path_cache.clear()
+        # Simulated breaks only hold for the topology they were made in
+        self._broken_links.clear()
+        
+        nodes = self.nodes
+        bounds = indptr.tolist()
+        ids = indices.tolist()
+        for i, node in enumerate(nodes):
+            node.update_neighbors([nodes[j] for j in ids[bounds[i]:bounds[i + 1]]])
+        self._rebuild_edges()
+    
+    def _rebuild_edges(self):
+        """Collect each neighbor link once, whichever direction it was recorded in"""
+        self._edges = sorted({(min(node.id, neighbor.id), max(node.id, neighbor.id))
+                              for node in self.nodes for neighbor in node.neighbors})
+    
     def add_pcap_packet(self, packet_type, from_node, to_node, hop_count, path=None):
         """Add a packet to PCAP recording"""
         if not self.pcap_enabled:
             return
             
+        self._seq_ctr += 1
         pcap_packet = PCAPPacket(
             timestamp=time.time(),
             src_node=from_node,
             dst_node=to_node,
             packet_type=packet_type,
             hop_count=hop_count,
-            path=path
+            path=path,
+            seq_num=self._seq_ctr
         )
         self.pcap_packets.append(pcap_packet)
+        self._pcap_queue.put_nowait(("packet", pcap_packet))
+    
+    def _clear_pcap(self):
+        self.pcap_packets = []
+        self._pcap_queue.put_nowait(("clear",))
+    
+    @staticmethod
+    def _encode_pcap_records(packets):
+        """Encode packets as one bytes chunk of libpcap records"""
+        return b"".join([packet.to_pcap_record() for packet in packets])
+    
+    def _pcap_worker(self):
+        """Drain the PCAP queue, encoding packets in batches and writing requested dumps"""
+        chunks = []
+        pending = []
+        while True:
+            commands = [self._pcap_queue.get()]
+            try:
+                while True:
+                    commands.append(self._pcap_queue.get_nowait())
+            except queue.Empty:
+                pass
+            
+            for command, *args in commands:
+                if command == "packet":
+                    pending.append(args[0])
+                    if len(pending) >= PCAP_BATCH_SIZE:
+                        chunks.append(self._encode_pcap_records(pending))
+                        pending = []
+                elif command == "clear":
+                    chunks = []
+                    pending = []
+                elif command == "write":
+                    filename, done, result = args
+                    # Any failure is reported back instead of ending the thread, so later
+                    # captures and dumps still work
+                    try:
+                        if pending:
+                            chunks.append(self._encode_pcap_records(pending))
+                            pending = []
+                        with open(filename, 'wb') as f:
+                            f.write(PCAP_GLOBAL_HEADER + b"".join(chunks))
+                        print(f"PCAP file generated: {filename}")
+                        result.append(True)
+                    except Exception as e:
+                        print(f"Error generating PCAP file: {e}")
+                        result.append(False)
+                    done.set()
     
     def generate_pcap_file(self):
-        """Generate a PCAP file from captured packets"""
+        """Generate a PCAP file from captured packets
+        
+        Returns (filename, written) where written is True on success, False on
+        failure and None while the writer thread is still busy.
+        """
         if not self.pcap_packets:
-            return None
-            
-        try:
-            # Create a simple text-based representation that can be parsed
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"aodv_simulation_{timestamp}.pcap.txt"
+            return None, False
             
-            with open(filename, 'w') as f:
-                f.write("# AODV Simulation PCAP Dump\n")
-                f.write("# Generated by AODV Simulator\n")
-                f.write(f"# Source: {self.source}, Destination: {self.destination}\n")
-                f.write(f"# Total Packets: {len(self.pcap_packets)}\n")
-                f.write("# Timestamp,Protocol,Source,Destination,Info\n")
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"aodv_simulation_{timestamp}.pcap"
+        
+        # The writer thread encodes the remaining records and writes the file; wait
+        # only briefly so a slow disk never stalls the frame loop
+        done = threading.Event()
+        result = []
+        self._pcap_queue.put_nowait(("write", filename, done, result))
+        if not done.wait(0.1):
+            return filename, None
+        return filename, result[0]
+    
+    def find_routes(self, source, destination):
+        """Return up to MAX_ROUTES shortest loop-free paths from source to destination.
+
+        Results are cached per (source, destination, broken links) and the cache is
+        cleared whenever the topology changes.
+        """
+        key = (source, destination, frozenset(self._broken_links))
+        if key not in self._path_cache:
+            self._path_cache[key] = self._k_shortest_paths(source, destination, key[2], MAX_ROUTES)
+        return self._path_cache[key]
+    
+    def _k_shortest_paths(self, source, destination, excluded_links, k):
+        # Yen's algorithm on top of a breadth-first shortest path search
+        first = self._shortest_path(source, destination, excluded_links)
+        if first is None:
+            return []
+        
+        paths = [first]
+        candidates = []  # heap of (hop count, path)
+        seen = {tuple(first)}
+        while len(paths) < k:
+            last = paths[-1]
+            for i in range(len(last) - 1):
+                root = last[:i + 1]
+                removed_links = set(excluded_links)
+                for path in paths:
+                    if path[:i + 1] == root:
+                        removed_links.add(frozenset((path[i], path[i + 1])))
                 
-                for i, packet in enumerate(self.pcap_packets):
-                    timestamp_str = datetime.datetime.fromtimestamp(packet.timestamp).strftime("%H:%M:%S.%f")[:-3]
-                    info = packet.get_wireshark_info()
-                    f.write(f"{timestamp_str},AODV,Node_{packet.src_node},Node_{packet.dst_node},\"{info}\"\n")
-            
-            print(f"PCAP file generated: {filename}")
+                spur = self._shortest_path(last[i], destination, removed_links, set(root[:-1]))
+                if spur is not None:
+                    candidate = root[:-1] + spur
+                    if tuple(candidate) not in seen:
+                        seen.add(tuple(candidate))
+                        heapq.heappush(candidates, (len(candidate), candidate))
             
-            # Create a batch file to open in Wireshark
-            batch_content = f"""@echo off
-echo AODV Simulation PCAP File
-echo =========================
-echo.
-echo File: {filename}
-echo Total Packets: {len(self.pcap_packets)}
-echo.
-echo This file contains AODV protocol packets that can be analyzed.
-echo Open this file in Wireshark or any text editor to view the packet details.
-echo.
-pause
-"""
-            
-            batch_filename = f"open_{timestamp}.bat"
-            with open(batch_filename, 'w') as f:
-                f.write(batch_content)
-            
-            return filename
-            
-        except Exception as e:
-            print(f"Error generating PCAP file: {e}")
+            if not candidates:
+                break
+            paths.append(heapq.heappop(candidates)[1])
+        return paths
+    
+    def _shortest_path(self, source, destination, excluded_links=frozenset(), excluded_nodes=frozenset()):
+        if self._adjacency is None:
+            self._adjacency = {node.id: [n.id for n in node.neighbors] for node in self.nodes}
+        
+        previous = {source: None}
+        frontier = deque([source])
+        while frontier:
+            node_id = frontier.popleft()
+            if node_id == destination:
+                break
+            for neighbor_id in self._adjacency[node_id]:
+                if neighbor_id in previous or neighbor_id in excluded_nodes:
+                    continue
+                if excluded_links and frozenset((node_id, neighbor_id)) in excluded_links:
+                    continue
+                previous[neighbor_id] = node_id
+                frontier.append(neighbor_id)
+        
+        if destination not in previous:
             return None
+        path = [destination]
+        while path[-1] != source:
+            path.append(previous[path[-1]])
+        path.reverse()
+        return path
     
     def enable_pcap(self, enabled=True):
         """Enable or disable PCAP recording"""
         self.pcap_enabled = enabled
         if enabled:
-            self.pcap_packets = []
-            if self.event_log:
-                self.event_log.add_event("PCAP recording ENABLED")
+            self._clear_pcap()
+            self._seq_ctr = 0
+            self.event_log.add_event("PCAP recording ENABLED")
         else:
-            if self.event_log:
-                self.event_log.add_event("PCAP recording DISABLED")
+            self.event_log.add_event("PCAP recording DISABLED")
     
     def toggle_mobility(self):
         self.mobility_enabled = not self.mobility_enabled
@@ -625,12 +1027,12 @@ pause
                 node.start_moving()
             else:
                 node.stop_moving()
+        self._load_arrays()
         
-        if self.event_log:
-            if self.mobility_enabled:
-                self.event_log.add_event("Node mobility ENABLED")
-            else:
-                self.event_log.add_event("Node mobility DISABLED")
+        if self.mobility_enabled:
+            self.event_log.add_event("Node mobility ENABLED")
+        else:
+            self.event_log.add_event("Node mobility DISABLED")
     
     def reset_simulation(self):
         self.active_packets = []
@@ -638,19 +1040,18 @@ pause
         self.simulation_running = False
         self.simulation_complete = False
         self.final_path = []
-        self.discovered_paths = []
+        self.discovered_paths = deque(maxlen=MAX_DRAWN_PATHS)
         self.all_discovered_paths_to_dest = []
         self.best_path_hop_count = float('inf')
         self.route_established = False
         self.packet_counter = 0
-        self.pcap_packets = []
+        self._broken_links.clear()
+        self._clear_pcap()
+        self._path_points.clear()
+        self._scene_version += 1
         for node in self.nodes:
-            node.rreq_seen.clear()
             node.color = NODE_COLOR
-        if self.event_log:
-            self.event_log.events.clear()
-            self.event_log.scroll_offset = 0
-            self.event_log.total_events = 0
+        self.event_log.clear()
     
     def start_simulation(self):
         if self.source is None or self.destination is None:
@@ -659,120 +1060,162 @@ pause
         self.reset_simulation()
         self.simulation_running = True
         self.enable_pcap(True)  # Enable PCAP recording for this simulation
-        if self.event_log:
-            self.event_log.add_event(f"Simulation: {self.source} → {self.destination}")
-            self.event_log.add_event(f"Network: {len(self.nodes)} nodes")
-            self.event_log.add_event("PCAP recording started")
-        self.start_rreq_flooding()
+        self.event_log.add_event(f"Simulation: {self.source} → {self.destination}")
+        self.event_log.add_event(f"Network: {len(self.nodes)} nodes")
+        self.event_log.add_event("PCAP recording started")
+        if not self.start_rreq_flooding():
+            self.simulation_complete = True
+            self.simulation_running = False
     
     def start_rreq_flooding(self):
-        self.rreq_broadcast_id = self.packet_counter
-        self.packet_counter += 1
+        # Each discovery round, including one restarted by a route error, collects its own routes
+        self.route_established = False
+        self.all_discovered_paths_to_dest = []
+        self.best_path_hop_count = float('inf')
+        self.planned_routes = self.find_routes(self.source, self.destination)
+        if not self.planned_routes:
+            self.event_log.add_event(f"No route exists to Node {self.destination}", PacketType.RREQ)
+            return False
+        
+        # RREQs are only animated along hops that lie on one of the planned routes
+        self._route_edges = {(route[i], route[i + 1]) for route in self.planned_routes
+                             for i in range(len(route) - 1)}
         
         source_node = self.nodes[self.source]
+        sent = 0
         for neighbor in source_node.neighbors:
+            if (self.source, neighbor.id) not in self._route_edges:
+                continue
             path = [self.source, neighbor.id]
             packet = AnimatedPacket(self.packet_counter, PacketType.RREQ, path, base_speed=0.8, 
                                   from_node=self.source, to_node=neighbor.id)
             self.packet_queue.append(packet)
             self.packet_counter += 1
             self.discovered_paths.append(path)
-            source_node.rreq_seen.add((self.source, self.rreq_broadcast_id))
+            sent += 1
             
-            if self.event_log:
+            if self.verbose_log:
                 self.event_log.add_event("Route Request sent", PacketType.RREQ, self.source, neighbor.id, 1)
             
             # Record in PCAP
             self.add_pcap_packet(PacketType.RREQ, self.source, neighbor.id, 1, path)
+        
+        if not self.verbose_log and sent:
+            self.event_log.add_event(f"Route Request sent to {sent} neighbors", PacketType.RREQ)
+        return True
     
     def process_packet_completion(self, packet):
-        current_node_id = packet.path[-1]
-        
-        if packet.type == PacketType.RREQ:
-            if current_node_id == self.destination:
-                self.all_discovered_paths_to_dest.append(packet.path)
-                hop_count = len(packet.path) - 1
-                
-                if hop_count < self.best_path_hop_count:
-                    self.best_path_hop_count = hop_count
-                    self.final_path = packet.path
-                    
-                    if self.event_log:
-                        self.event_log.add_event(f"Better path found", PacketType.RREQ, 
-                                               packet.path[0], self.destination, hop_count)
-                    
-                    self.send_rrep_back(packet.path)
+        self._handlers[packet.type](packet, packet.path[-1])
+    
+    def _on_rreq(self, packet, current_node_id):
+        """Collect a route at the destination, otherwise forward the request along planned hops"""
+        if current_node_id == self.destination:
+            self.all_discovered_paths_to_dest.append(packet.path)
+            hop_count = len(packet.path) - 1
+            
+            if hop_count < self.best_path_hop_count:
+                self.best_path_hop_count = hop_count
+                self.final_path = packet.path
                 
-                if len(self.all_discovered_paths_to_dest) >= 5 or self.best_path_hop_count <= 2:
-                    self.route_established = True
-                    if self.event_log:
-                        self.event_log.add_event(f"Stopping RREQ - Found {len(self.all_discovered_paths_to_dest)} paths")
-                    return
+                self.event_log.add_event(f"Better path found", PacketType.RREQ, 
+                                       packet.path[0], self.destination, hop_count)
                 
-            current_node = self.nodes[current_node_id]
-            for neighbor in current_node.neighbors:
-                if neighbor.id not in packet.path:
-                    rreq_key = (self.source, self.rreq_broadcast_id)
-                    if rreq_key not in neighbor.rreq_seen:
-                        new_path = packet.path + [neighbor.id]
-                        new_packet = AnimatedPacket(self.packet_counter, PacketType.RREQ, new_path, base_speed=0.8,
-                                                  from_node=current_node_id, to_node=neighbor.id)
-                        self.packet_queue.append(new_packet)
-                        self.packet_counter += 1
-                        self.discovered_paths.append(new_path)
-                        neighbor.rreq_seen.add(rreq_key)
-                        
-                        if self.event_log:
-                            hop_count = len(new_path) - 1
-                            self.event_log.add_event("Route Request forwarded", PacketType.RREQ, 
-                                                   current_node_id, neighbor.id, hop_count)
-                        
-                        # Record in PCAP
-                        self.add_pcap_packet(PacketType.RREQ, current_node_id, neighbor.id, hop_count, new_path)
-        
-        elif packet.type == PacketType.RREP:
-            if current_node_id == self.source:
-                if self.event_log:
-                    self.event_log.add_event("Route Reply reached source", PacketType.RREP)
-                self.send_data_packet()
-            else:
-                if len(packet.path) > 1:
-                    from_node = packet.path[-2]
-                    to_node = packet.path[-1]
-                    if self.event_log:
-                        self.event_log.add_event("Route Reply forwarded", PacketType.RREP, from_node, to_node)
-                    
-                    # Record in PCAP
-                    self.add_pcap_packet(PacketType.RREP, from_node, to_node, len(packet.path)-1, packet.path)
-        
-        elif packet.type == PacketType.DATA:
-            if current_node_id == self.destination:
-                if self.event_log:
-                    self.event_log.add_event("Data reached destination!", PacketType.DATA)
-                self.simulation_complete = True
-                self.simulation_running = False
-            else:
-                if len(packet.path) > 1:
-                    from_node = packet.path[-2]
-                    to_node = packet.path[-1]
-                    if self.event_log:
-                        self.event_log.add_event("Data forwarded", PacketType.DATA, from_node, to_node)
-                    
-                    # Record in PCAP
-                    self.add_pcap_packet(PacketType.DATA, from_node, to_node, len(packet.path)-1, packet.path)
-        
-        elif packet.type == PacketType.RERR:
-            if self.event_log:
-                self.event_log.add_event("Route Error processed", PacketType.RERR, 
-                                       packet.from_node, packet.to_node)
+                self.send_rrep_back(packet.path)
             
-            # Record in PCAP
-            self.add_pcap_packet(PacketType.RERR, packet.from_node, packet.to_node, 1, [packet.from_node, packet.to_node])
+            # Every planned route has been traced, so nothing new can still arrive
+            if len(self.all_discovered_paths_to_dest) >= len(self.planned_routes):
+                self._finish_discovery()
+            return
+        
+        if self.route_established:
+            return
             
-            if current_node_id == self.source:
-                if self.event_log:
-                    self.event_log.add_event("Initiating new route discovery due to RERR")
-                self.start_rreq_flooding()
+        current_node = self.nodes[current_node_id]
+        forwarded = 0
+        visited = packet.visited
+        for neighbor in current_node.neighbors:
+            if (current_node_id, neighbor.id) not in self._route_edges:
+                continue
+            bit = 1 << neighbor.id
+            # Forwarding is confined to planned-route hops, so routes sharing nodes are not
+            # suppressed as duplicates; the visited mask alone keeps each path loop-free
+            if not visited & bit:
+                new_path = packet.path + [neighbor.id]
+                new_packet = AnimatedPacket(self.packet_counter, PacketType.RREQ, new_path, base_speed=0.8,
+                                          from_node=current_node_id, to_node=neighbor.id,
+                                          visited=visited | bit)
+                self.packet_queue.append(new_packet)
+                self.packet_counter += 1
+                self.discovered_paths.append(new_path)
+                forwarded += 1
+                hop_count = len(new_path) - 1
+                
+                if self.verbose_log:
+                    self.event_log.add_event("Route Request forwarded", PacketType.RREQ, 
+                                           current_node_id, neighbor.id, hop_count)
+                
+                # Record in PCAP
+                self.add_pcap_packet(PacketType.RREQ, current_node_id, neighbor.id, hop_count, new_path)
+        
+        if not self.verbose_log and forwarded:
+            self.event_log.add_event(f"Node {current_node_id} forwarded Route Request to {forwarded} neighbors",
+                                     PacketType.RREQ, hop_count=len(packet.path))
+    
+    def _finish_discovery(self):
+        """End the current route discovery and drop any RREQs still waiting to be sent"""
+        if self.route_established:
+            return
+        self.route_established = True
+        self.packet_queue = deque(p for p in self.packet_queue if p.type != PacketType.RREQ)
+        self.event_log.add_event(f"Stopping flood - Found {len(self.all_discovered_paths_to_dest)} paths",
+                                 PacketType.RREQ)
+    
+    def _on_rrep(self, packet, current_node_id):
+        """Start data transfer once the reply reaches the source, otherwise record the hop"""
+        if current_node_id == self.source:
+            self.event_log.add_event("Route Reply reached source", PacketType.RREP)
+            self.send_data_packet()
+        else:
+            if len(packet.path) > 1:
+                from_node = packet.path[-2]
+                to_node = packet.path[-1]
+                self.event_log.add_event("Route Reply forwarded", PacketType.RREP, from_node, to_node)
+                
+                # Record in PCAP
+                self.add_pcap_packet(PacketType.RREP, from_node, to_node, len(packet.path)-1, packet.path)
+    
+    def _on_data(self, packet, current_node_id):
+        """Finish the simulation at the destination, otherwise record the hop"""
+        if current_node_id == self.destination:
+            self.event_log.add_event("Data reached destination!", PacketType.DATA)
+            self._finish_discovery()
+            self.simulation_complete = True
+            self.simulation_running = False
+        else:
+            if len(packet.path) > 1:
+                from_node = packet.path[-2]
+                to_node = packet.path[-1]
+                self.event_log.add_event("Data forwarded", PacketType.DATA, from_node, to_node)
+                
+                # Record in PCAP
+                self.add_pcap_packet(PacketType.DATA, from_node, to_node, len(packet.path)-1, packet.path)
+    
+    def _on_rerr(self, packet, current_node_id):
+        """Record the error and restart route discovery once it reaches the source"""
+        self.event_log.add_event("Route Error processed", PacketType.RERR, 
+                               packet.from_node, packet.to_node)
+        
+        # Record in PCAP
+        self.add_pcap_packet(PacketType.RERR, packet.from_node, packet.to_node, 1, [packet.from_node, packet.to_node])
+        
+        if current_node_id == self.source:
+            # Packets still using the broken route are lost and the old route is dropped,
+            # so only the new discovery can pick the next path
+            self.active_packets = [p for p in self.active_packets if p.type == PacketType.RERR]
+            self.packet_queue = deque(p for p in self.packet_queue if p.type == PacketType.RERR)
+            self.final_path = []
+            self.event_log.add_event("Initiating new route discovery", PacketType.RERR)
+            self.start_rreq_flooding()
     
     def send_rrep_back(self, path):
         rrep_path = list(reversed(path))
@@ -780,8 +1223,7 @@ pause
         self.packet_queue.append(rrep_packet)
         self.packet_counter += 1
         
-        if self.event_log:
-            self.event_log.add_event("Route Reply sent back", PacketType.RREP, path[-1], path[-2])
+        self.event_log.add_event("Route Reply sent back", PacketType.RREP, path[-1], path[-2])
         
         # Record in PCAP
         self.add_pcap_packet(PacketType.RREP, path[-1], path[-2], len(path)-1, rrep_path)
@@ -791,56 +1233,88 @@ pause
         self.packet_queue.append(data_packet)
         self.packet_counter += 1
         
-        if self.event_log:
-            self.event_log.add_event("Data transmission started", PacketType.DATA, self.source, self.final_path[1])
+        self.event_log.add_event("Data transmission started", PacketType.DATA, self.source, self.final_path[1])
         
         # Record in PCAP
         self.add_pcap_packet(PacketType.DATA, self.source, self.final_path[1], 1, self.final_path)
     
     def simulate_route_error(self):
         if not self.final_path or len(self.final_path) < 3:
-            if self.event_log:
-                self.event_log.add_event("Cannot simulate RERR - no established route")
+            self.event_log.add_event("Cannot simulate - no established route", PacketType.RERR)
             return
         
         break_index = random.randint(1, len(self.final_path) - 2)
         from_node = self.final_path[break_index - 1]
         to_node = self.final_path[break_index]
+        self._broken_links.add(frozenset((from_node, to_node)))
         
-        rerr_path = [from_node, to_node]
+        # The error travels back over the broken link's upstream hops to the source,
+        # which then re-plans with that link excluded
+        rerr_path = list(reversed(self.final_path[:break_index + 1]))
         rerr_packet = AnimatedPacket(self.packet_counter, PacketType.RERR, rerr_path, base_speed=0.8,
                                    from_node=from_node, to_node=to_node)
         self.packet_queue.append(rerr_packet)
         self.packet_counter += 1
         
-        if self.event_log:
-            self.event_log.add_event("Simulating Route Error - Link break", PacketType.RERR, from_node, to_node)
+        self.event_log.add_event("Simulating Route Error - Link break", PacketType.RERR, from_node, to_node)
         
         # Record in PCAP
-        self.add_pcap_packet(PacketType.RERR, from_node, to_node, 1, rerr_path)
+        self.add_pcap_packet(PacketType.RERR, to_node, from_node, len(rerr_path) - 1, rerr_path)
+    
+    def new_formation(self, num_nodes=None):
+        """Build a new network, optionally resizing it, and clear the chosen endpoints"""
+        if num_nodes is not None:
+            self.num_nodes = num_nodes
+        self.setup_nodes()
+        self.reset_simulation()
+        self.source = None
+        self.destination = None
+        self.event_log.add_event(f"Network reset: {self.num_nodes} nodes")
+    
+    def post(self, command, *args):
+        """Queue a control command (a simulator method) to run at the start of the next tick"""
+        self._mailbox.put((command, args))
+    
+    def has_pending_commands(self):
+        return not self._mailbox.empty()
+    
+    def _drain_mailbox(self):
+        while not self._mailbox.empty():
+            command, args = self._mailbox.get_nowait()
+            command(*args)
     
     def update(self, delta_time):
+        self._drain_mailbox()
         if not self.simulation_running:
             return
             
         if self.mobility_enabled:
-            for node in self.nodes:
-                node.update_position(delta_time)
-                node.update_neighbors(self.nodes)
+            self._step_mobility(delta_time)
         
+        # Split finished packets from survivors in the same pass that advances them
+        survivors = []
         completed_packets = []
         for packet in self.active_packets:
             if packet.update(delta_time, self.animation_speed):
                 completed_packets.append(packet)
+            else:
+                survivors.append(packet)
         
-        for packet in completed_packets:
-            self.active_packets.remove(packet)
-            self.process_packet_completion(packet)
+        if completed_packets:
+            self.active_packets = survivors
+            for packet in completed_packets:
+                self.process_packet_completion(packet)
         
         while self.packet_queue and len(self.active_packets) < 5:
             new_packet = self.packet_queue.popleft()
             self.active_packets.append(new_packet)
         
+        # The flood can also die out early, e.g. when mobility removes a planned hop
+        if self.planned_routes and not self.route_established:
+            if not any(p.type == PacketType.RREQ for p in self.active_packets) and \
+               not any(p.type == PacketType.RREQ for p in self.packet_queue):
+                self._finish_discovery()
+        
         if not self.active_packets and not self.packet_queue and self.simulation_running:
             if self.final_path:
                 self.send_data_packet()
@@ -851,38 +1325,84 @@ pause
     def set_animation_speed(self, speed):
         self.animation_speed = speed
 
-    def draw(self, screen, font):
+    def render_background(self):
+        """Render the static background fill and grid lines onto one surface"""
+        background = pygame.Surface((WIDTH, HEIGHT)).convert()
+        background.fill(BACKGROUND)
         for x in range(0, NETWORK_WIDTH, 80):
-            pygame.draw.line(screen, GRID_COLOR, (x, 0), (x, HEIGHT), 1)
+            pygame.draw.line(background, GRID_COLOR, (x, 0), (x, HEIGHT), 1)
         for y in range(0, HEIGHT, 80):
-            pygame.draw.line(screen, GRID_COLOR, (0, y), (NETWORK_WIDTH, y), 1)
-        
-        for node in self.nodes:
-            for neighbor in node.neighbors:
-                pygame.draw.line(screen, (80, 80, 80, 100), (node.x, node.y), 
-                               (neighbor.x, neighbor.y), 1)
-        
-        for path in self.discovered_paths[-50:]:
-            for i in range(len(path) - 1):
-                node1 = self.nodes[path[i]]
-                node2 = self.nodes[path[i + 1]]
-                pygame.draw.line(screen, (100, 100, 100, 150), (node1.x, node1.y), 
-                               (node2.x, node2.y), 2)
+            pygame.draw.line(background, GRID_COLOR, (0, y), (NETWORK_WIDTH, y), 1)
+        return background
+    
+    def path_points(self, path):
+        """Return the screen points along path, memoized until nodes move"""
+        key = tuple(path)
+        points = self._path_points.get(key)
+        if points is None:
+            points = [(self.nodes[node_id].x, self.nodes[node_id].y) for node_id in path]
+            self._path_points[key] = points
+        return points
+    
+    def render_links(self):
+        """Redraw the background and neighbor links into the cached links surface"""
+        if self._background is None:
+            self._background = self.render_background()
+        if self._links_surface is None:
+            self._links_surface = self._background.copy()
+        else:
+            self._links_surface.blit(self._background, (0, 0))
         
+        nodes = self.nodes
+        for a, b in self._edges:
+            pygame.draw.line(self._links_surface, (80, 80, 80, 100), (nodes[a].x, nodes[a].y), 
+                           (nodes[b].x, nodes[b].y), 1)
+        self._links_dirty = False
+    
+    def draw(self, screen, font):
+        if self._links_dirty or self._links_surface is None:
+            self.render_links()
+        screen.blit(self._links_surface, (0, 0))
+        
+        for path in self.discovered_paths:
+            if len(path) > 1:
+                pygame.draw.lines(screen, (100, 100, 100, 150), False, self.path_points(path), 2)
+        
+        blits_list = []
+        for node_id in (self.source, self.destination):
+            if node_id is not None:
+                blits_list.append(self.nodes[node_id].get_range_blit())
         for node in self.nodes:
             is_source = (node.id == self.source)
             is_dest = (node.id == self.destination)
-            node.draw(screen, font, False, is_source, is_dest)
+            blits_list.append(node.get_blit(font, False, is_source, is_dest))
+        blit_batch(screen, blits_list)
         
-        if self.final_path:
-            for i in range(len(self.final_path) - 1):
-                node1 = self.nodes[self.final_path[i]]
-                node2 = self.nodes[self.final_path[i + 1]]
-                pygame.draw.line(screen, HIGHLIGHT_COLOR, (node1.x, node1.y), 
-                               (node2.x, node2.y), 4)
+        if len(self.final_path) > 1:
+            pygame.draw.lines(screen, HIGHLIGHT_COLOR, False, self.path_points(self.final_path), 4)
         
+        offset = PACKET_RADIUS + 1
+        size = offset * 2
+        packet_blits = []
+        self._packet_rects = []
         for packet in self.active_packets:
-            packet.draw(screen, self.nodes)
+            if not packet.completed:
+                x, y = packet.get_current_position(self.nodes)
+                packet_blits.append((self._packet_sprites[packet.type], (x - offset, y - offset)))
+                self._packet_rects.append(pygame.Rect(x - offset, y - offset, size, size))
+        blit_batch(screen, packet_blits)
+    
+    def get_dirty_rects(self):
+        """Return the parts of the network area that changed since the last call"""
+        key = (self._scene_version, self.source, self.destination, self.packet_counter, len(self.final_path))
+        moving = self.mobility_enabled and self.simulation_running
+        if moving or key != self._scene_key:
+            dirty_rects = [pygame.Rect(0, 0, NETWORK_WIDTH, HEIGHT)]
+        else:
+            dirty_rects = self._last_packet_rects + self._packet_rects
+        self._scene_key = key
+        self._last_packet_rects = self._packet_rects
+        return dirty_rects
 
 def draw_introduction_screen(screen, start_button):
     screen.fill(INTRO_BG)
@@ -1017,16 +1537,42 @@ def draw_introduction_screen(screen, start_button):
     screen.blit(footer, (WIDTH//2 - footer.get_width()//2, HEIGHT - 40))
 
 def draw_simulation_screen(screen, font, title_font, node_input, set_nodes_button, run_sim_button, 
-                 reset_button, new_formation_button, rerr_button, pcap_button, speed_slider, mobility_toggle, simulator):
+                 reset_button, new_formation_button, rerr_button, pcap_button, speed_slider, mobility_toggle,
+                 verbose_toggle, simulator, panel_cache):
+    """Draw the control panel, reusing the cached panel image while nothing on it changed.
+
+    Returns True if the panel was redrawn this frame.
+    """
     panel_rect = pygame.Rect(NETWORK_WIDTH, 0, WIDTH - NETWORK_WIDTH, HEIGHT)
+    
+    status_info = [
+        f"Total Nodes: {len(simulator.nodes)}",
+        f"Source: {simulator.source if simulator.source is not None else 'None'}",
+        f"Target: {simulator.destination if simulator.destination is not None else 'None'}",
+        f"Active Packets: {len(simulator.active_packets)}",
+        f"Queued Packets: {len(simulator.packet_queue)}",
+        f"Paths Found: {len(simulator.all_discovered_paths_to_dest)}",
+        f"Best Hops: {simulator.best_path_hop_count if simulator.best_path_hop_count != float('inf') else 'N/A'}",
+        f"Mobility: {'ON' if simulator.mobility_enabled else 'OFF'}",
+        f"PCAP Packets: {len(simulator.pcap_packets)}",
+        f"State: {'RUNNING' if simulator.simulation_running else 'DONE' if simulator.simulation_complete else 'READY'}"
+    ]
+    
+    widgets = [node_input, set_nodes_button, run_sim_button, reset_button, new_formation_button,
+               rerr_button, pcap_button, speed_slider, mobility_toggle, verbose_toggle, simulator.event_log]
+    
+    if ("surface" in panel_cache and panel_cache["status"] == status_info and
+        not any(widget.dirty for widget in widgets)):
+        screen.blit(panel_cache["surface"], panel_rect)
+        return False
+    
     pygame.draw.rect(screen, UI_COLOR, panel_rect)
     pygame.draw.line(screen, (60, 80, 100), (NETWORK_WIDTH, 0), (NETWORK_WIDTH, HEIGHT), 3)
     
     title = title_font.render("AODV SIMULATOR", True, (255, 255, 200))
     screen.blit(title, (NETWORK_WIDTH + 20, 25))
     
-    if simulator.event_log:
-        simulator.event_log.draw(screen)
+    simulator.event_log.draw(screen)
     
     controls_y = 220
     control_title = font.render("CONTROLS", True, (200, 200, 255))
@@ -1046,6 +1592,11 @@ def draw_simulation_screen(screen, font, title_font, node_input, set_nodes_butto
     mobility_toggle.rect.y = controls_y + 130
     mobility_toggle.draw(screen)
     
+    verbose_label = font.render("Verbose:", True, TEXT_COLOR)
+    screen.blit(verbose_label, (NETWORK_WIDTH + 160, controls_y + 130))
+    verbose_toggle.rect.y = controls_y + 130
+    verbose_toggle.draw(screen)
+    
     # First row of buttons
     run_sim_button.rect.y = controls_y + 180
     run_sim_button.rect.width = 120
@@ -1075,22 +1626,14 @@ def draw_simulation_screen(screen, font, title_font, node_input, set_nodes_butto
     status_title = font.render("STATUS", True, (200, 200, 255))
     screen.blit(status_title, (NETWORK_WIDTH + 20, status_y))
     
-    status_info = [
-        f"Total Nodes: {len(simulator.nodes)}",
-        f"Source: {simulator.source if simulator.source is not None else 'None'}",
-        f"Target: {simulator.destination if simulator.destination is not None else 'None'}",
-        f"Active Packets: {len(simulator.active_packets)}",
-        f"Queued Packets: {len(simulator.packet_queue)}",
-        f"Paths Found: {len(simulator.all_discovered_paths_to_dest)}",
-        f"Best Hops: {simulator.best_path_hop_count if simulator.best_path_hop_count != float('inf') else 'N/A'}",
-        f"Mobility: {'ON' if simulator.mobility_enabled else 'OFF'}",
-        f"PCAP Packets: {len(simulator.pcap_packets)}",
-        f"State: {'RUNNING' if simulator.simulation_running else 'DONE' if simulator.simulation_complete else 'READY'}"
-    ]
-    
+    # Only status lines whose text changed since the last redraw are rendered again
+    line_cache = panel_cache.setdefault("status_lines", {})
     for i, line in enumerate(status_info):
-        text = font.render(line, True, TEXT_COLOR)
-        screen.blit(text, (NETWORK_WIDTH + 20, status_y + 35 + i * 25))
+        cached = line_cache.get(i)
+        if cached is None or cached[0] != line:
+            cached = (line, font.render(line, True, TEXT_COLOR))
+            line_cache[i] = cached
+        screen.blit(cached[1], (NETWORK_WIDTH + 20, status_y + 35 + i * 25))
     
     legend_y = 800
     legend_title = font.render("LEGEND", True, (200, 200, 255))
@@ -1109,12 +1652,25 @@ def draw_simulation_screen(screen, font, title_font, node_input, set_nodes_butto
         pygame.draw.rect(screen, color, (NETWORK_WIDTH + 20, legend_y + 35 + i * 25, 16, 16))
         legend_text = font.render(text, True, TEXT_COLOR)
         screen.blit(legend_text, (NETWORK_WIDTH + 45, legend_y + 35 + i * 25))
+    
+    panel_cache["surface"] = screen.subsurface(panel_rect).copy()
+    panel_cache["status"] = status_info
+    for widget in widgets:
+        widget.dirty = False
+    return True
 
 def main():
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("AODV Protocol Simulator with PCAP Export")
     clock = pygame.time.Clock()
     
+    # Only queue the event types the UI handles; mouse motion is let through while dragging
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP,
+                              pygame.MOUSEWHEEL, pygame.KEYDOWN, pygame.TEXTINPUT,
+                              pygame.WINDOWEXPOSED])
+    motion_allowed = False
+    
     font = pygame.font.SysFont('Arial', 14)
     title_font = pygame.font.SysFont('Arial', 20, bold=True)
     button_font = pygame.font.SysFont('Arial', 20, bold=True)
@@ -1135,6 +1691,7 @@ def main():
     set_nodes_button = Button(NETWORK_WIDTH + 150, 260, 80, 28, "Apply", font)
     speed_slider = Slider(NETWORK_WIDTH + 20, 310, WIDTH - NETWORK_WIDTH - 40, 16, 0.3, 2.0, 1.0, font, "Speed")
     mobility_toggle = ToggleButton(NETWORK_WIDTH + 90, 340, 50, 25, "", font)
+    verbose_toggle = ToggleButton(NETWORK_WIDTH + 230, 340, 50, 25, "", font, initial_state=simulator.verbose_log)
     run_sim_button = Button(NETWORK_WIDTH + 20, 380, 120, 35, "RUN SIM", font)
     reset_button = Button(NETWORK_WIDTH + 150, 380, 120, 35, "RESET", font)
     rerr_button = Button(NETWORK_WIDTH + 20, 430, 120, 35, "SIM RERR", font)
@@ -1142,6 +1699,10 @@ def main():
     pcap_button = Button(NETWORK_WIDTH + 20, 480, 120, 35, "GENERATE PCAP", font, 
                          color=(180, 100, 50), hover_color=(220, 140, 70))
     
+    panel_rect = pygame.Rect(NETWORK_WIDTH, 0, WIDTH - NETWORK_WIDTH, HEIGHT)
+    panel_cache = {}
+    full_redraw = True
+    
     running = True
     last_time = time.time()
     pcap_generated = False
@@ -1160,6 +1721,11 @@ def main():
             if event.type == pygame.QUIT:
                 running = False
             
+            # Dirty-rect updates assume the window still holds the last frame
+            if event.type == pygame.WINDOWEXPOSED:
+                full_redraw = True
+                continue
+            
             # Handle event log scrolling
             if current_state == GameState.SIMULATION:
                 if simulator.event_log.handle_event(event, mouse_pos):
@@ -1168,6 +1734,7 @@ def main():
             if current_state == GameState.INTRODUCTION:
                 if start_button.is_clicked(mouse_pos, event):
                     current_state = GameState.SIMULATION
+                    full_redraw = True
             
             elif current_state == GameState.SIMULATION:
                 new_text = node_input.handle_event(event)
@@ -1178,70 +1745,80 @@ def main():
                 simulator.set_animation_speed(speed_slider.value)
                 
                 if mobility_toggle.is_clicked(mouse_pos, event):
-                    simulator.toggle_mobility()
+                    simulator.post(simulator.toggle_mobility)
+                
+                if verbose_toggle.is_clicked(mouse_pos, event):
+                    simulator.verbose_log = verbose_toggle.state
+                    simulator.event_log.add_event(f"Verbose RREQ logging {'ON' if simulator.verbose_log else 'OFF'}")
                 
                 if set_nodes_button.is_clicked(mouse_pos, event):
                     if node_input.text.isdigit():
-                        simulator.num_nodes = min(max(3, int(node_input.text)), 99)
-                        simulator.setup_nodes()
-                        simulator.source = None
-                        simulator.destination = None
-                        if simulator.event_log:
-                            simulator.event_log.add_event(f"Network reset: {simulator.num_nodes} nodes")
+                        simulator.post(simulator.new_formation, min(max(3, int(node_input.text)), 99))
+                        pcap_generated = False
                 
                 if run_sim_button.is_clicked(mouse_pos, event):
                     if simulator.source is not None and simulator.destination is not None:
-                        simulator.start_simulation()
+                        simulator.post(simulator.start_simulation)
                         pcap_generated = False
                 
                 if reset_button.is_clicked(mouse_pos, event):
-                    simulator.reset_simulation()
+                    simulator.post(simulator.reset_simulation)
                     simulator.source = None
                     simulator.destination = None
                     pcap_generated = False
                 
                 if rerr_button.is_clicked(mouse_pos, event):
-                    simulator.simulate_route_error()
+                    simulator.post(simulator.simulate_route_error)
                 
                 if new_formation_button.is_clicked(mouse_pos, event):
-                    simulator.setup_nodes()
-                    simulator.source = None
-                    simulator.destination = None
-                    simulator.reset_simulation()
+                    simulator.post(simulator.new_formation)
                     pcap_generated = False
                 
                 if pcap_button.is_clicked(mouse_pos, event):
                     if simulator.pcap_packets:
-                        filename = simulator.generate_pcap_file()
-                        if filename:
-                            if simulator.event_log:
-                                simulator.event_log.add_event(f"PCAP file generated: {filename}")
+                        filename, written = simulator.generate_pcap_file()
+                        if written:
+                            simulator.event_log.add_event(f"PCAP file generated: {filename}")
                             pcap_generated = True
                             # Update button text to show success
-                            pcap_button.text = "PCAP GENERATED!"
+                            pcap_button.set_text("PCAP GENERATED!")
+                        elif written is None:
+                            simulator.event_log.add_event(f"PCAP file still writing: {filename}")
+                        else:
+                            simulator.event_log.add_event(f"PCAP file could not be written: {filename}")
                     else:
-                        if simulator.event_log:
-                            simulator.event_log.add_event("No packets captured for PCAP generation")
+                        simulator.event_log.add_event("No packets captured for PCAP generation")
                 
-                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                # Node picks wait until queued commands (e.g. a rebuild) have run, so they
+                # always refer to the formation that will be simulated
+                if (event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and
+                    not simulator.has_pending_commands()):
                     if mouse_pos[0] < NETWORK_WIDTH:
+                        mouse_x, mouse_y = mouse_pos
                         for node in simulator.nodes:
-                            if math.sqrt((node.x - mouse_pos[0])**2 + (node.y - mouse_pos[1])**2) <= NODE_RADIUS:
+                            dx = node.x - mouse_x
+                            dy = node.y - mouse_y
+                            if dx * dx + dy * dy <= NODE_RADIUS * NODE_RADIUS:
                                 if simulator.source is None:
                                     simulator.source = node.id
-                                    if simulator.event_log:
-                                        simulator.event_log.add_event(f"Source: Node {node.id}")
+                                    simulator.event_log.add_event(f"Source: Node {node.id}")
                                 elif simulator.destination is None and node.id != simulator.source:
                                     simulator.destination = node.id
-                                    if simulator.event_log:
-                                        simulator.event_log.add_event(f"Target: Node {node.id}")
+                                    simulator.event_log.add_event(f"Target: Node {node.id}")
                                 else:
                                     simulator.source = node.id
                                     simulator.destination = None
-                                    if simulator.event_log:
-                                        simulator.event_log.add_event(f"Source: Node {node.id}")
+                                    simulator.event_log.add_event(f"Source: Node {node.id}")
                                 break
         
+        dragging = speed_slider.dragging or simulator.event_log.scrollbar_dragging
+        if dragging != motion_allowed:
+            if dragging:
+                pygame.event.set_allowed(pygame.MOUSEMOTION)
+            else:
+                pygame.event.set_blocked(pygame.MOUSEMOTION)
+            motion_allowed = dragging
+        
         # Update hover states
         if current_state == GameState.INTRODUCTION:
             start_button.is_hovered(mouse_pos)
@@ -1253,6 +1830,7 @@ def main():
             new_formation_button.is_hovered(mouse_pos)
             pcap_button.is_hovered(mouse_pos)
             mobility_toggle.is_hovered(mouse_pos)
+            verbose_toggle.is_hovered(mouse_pos)
         
         # Update simulation
         if current_state == GameState.SIMULATION:
@@ -1260,20 +1838,30 @@ def main():
             
             # Reset PCAP button text after generation
             if pcap_generated and not pcap_button.hovered:
-                pcap_button.text = "GENERATE PCAP"
+                pcap_button.set_text("GENERATE PCAP")
                 pcap_generated = False
         
         # Draw appropriate screen
-        screen.fill(BACKGROUND)
-        
         if current_state == GameState.INTRODUCTION:
             draw_introduction_screen(screen, start_button)
+            pygame.display.flip()
         else:
             simulator.draw(screen, font)
-            draw_simulation_screen(screen, font, title_font, node_input, set_nodes_button, run_sim_button, 
-                                 reset_button, new_formation_button, rerr_button, pcap_button, speed_slider, mobility_toggle, simulator)
+            panel_changed = draw_simulation_screen(screen, font, title_font, node_input, set_nodes_button, run_sim_button, 
+                                 reset_button, new_formation_button, rerr_button, pcap_button, speed_slider, mobility_toggle,
+                                 verbose_toggle, simulator,
+                                 panel_cache)
+            
+            # Only push the regions that changed to the display
+            dirty_rects = simulator.get_dirty_rects()
+            if full_redraw:
+                pygame.display.flip()
+                full_redraw = False
+            else:
+                if panel_changed:
+                    dirty_rects.append(panel_rect)
+                pygame.display.update(dirty_rects)
         
-        pygame.display.flip()
         clock.tick(60)
     
     pygame.quit()